@@ -7,14 +7,108 @@ Messages forwarded using send_to_TG() uses HTML parsing, so the characters
 "<", ">", and "&" will be replaced.
 """
 
-import os, discord, logging, json, re
+import os, discord, logging, json, re, asyncio, pickle
 from dotenv import load_dotenv
 from telegram import Bot
-from telegram.error import Forbidden
-from pandas import read_pickle
-from helpers import return_pretty, log, iter_to_str, write_to_pickle
+from telegram.error import Forbidden, RetryAfter
+from telegram.request import HTTPXRequest
+from helpers import return_pretty, log, iter_to_str, UserStore
 load_dotenv()
 
+# Patterns used to parse Discord messages before forwarding them to Telegram
+_URL_RE = re.compile(r"""((https://|http://)[^ <>'"{}|\\^`[\]]*)""")
+_MENTION_RE = re.compile(r"<@(&)?([0-9]+)>")    # Group 1 is "&" for role mentions
+_CHANNEL_MENTION_RE = re.compile(r"&lt;#([0-9]+)&gt;")
+# Shared default for index lookups without a match (no allocation per lookup)
+_NO_IDS = frozenset()
+# Telegram messages sent at the same time (= size of the bot's connection pool)
+_MAX_CONCURRENT_SENDS = 25
+# Attempts per message if Telegram's flood control asks to retry later
+_SEND_ATTEMPTS = 3
+# "<" not followed by "b>", "i>", "u>", "/" or "a" and ">" not preceded by
+# "b", "i", "a", "u" or "'" (i.e. not part of an HTML tag)
+_ESCAPE_RE = re.compile("<(?!(?:b>|i>|u>|/|a))|(?<!['biau])>")
+_ESCAPE_SEQUENCES = {"<": "&lt;", ">": "&gt;"}
+
+
+def add_html_hyperlinks(_str):
+    """Adds html hyperlink tags around any url starting with http or https."""
+    if "http" not in _str:
+        return _str
+    return _URL_RE.sub(r"<a href='\1'>\1</a>", _str)
+
+
+def resolve_mentions(_str, guild):
+    """Replaces mentions of user & role ids with user nicks/names & role names."""
+    if "<@" not in _str:
+        return _str
+
+    names = {}    # Resolve each user or role id only once
+
+    def replace(match):
+        id_match = match.group(0)
+        if id_match not in names:
+            id_int = int(match.group(2))
+            if match.group(1):
+                name = guild.get_role(id_int).name
+            else:
+                member = guild.get_member(id_int)
+                name = member.nick or member.name
+            names[id_match] = "🌀<i>"+name+"</i>"
+        return names[id_match]
+
+    # Replace each user id with a nickname or username, each role id with its name
+    return _MENTION_RE.sub(replace, _str)
+
+
+def resolve_channels(_str, guild):
+    """Wraps a hyperlink with the channel name around mentions of channel ids."""
+    if "&lt;#" not in _str:
+        return _str
+
+    links = {}    # Resolve each channel id only once
+
+    def replace(match):
+        id_match = match.group(1)
+        if id_match not in links:
+            channel = guild.get_channel_or_thread(int(id_match))
+            links[id_match] = f"<a href='{channel.jump_url}'>{channel.name}</a>"
+        return links[id_match]
+
+    # Wrap a hyperlink around each channel id
+    return _CHANNEL_MENTION_RE.sub(replace, _str)
+
+
+def _escape_match(match):
+    """Returns the escape sequence for a special character matched by _ESCAPE_RE."""
+    return _ESCAPE_SEQUENCES[match.group(0)]
+
+
+def escape_chars(_str):
+    """
+    Replaces the HTML special character "&".
+    Replace "<", ">", "&" if not within HTML tags <b>, <i> and <a>.
+    """
+    # Replace "&" with "&amp;" everywhere (no regex needed)
+    if "&" in _str:
+        _str = _str.replace("&", "&amp;")
+
+    # Skip the regex engine if there are no "<" or ">"
+    if "<" not in _str and ">" not in _str:
+        return _str
+
+    # Replace "<" and ">" in a single pass if not part of an HTML tag
+    return _ESCAPE_RE.sub(_escape_match, _str)
+
+
+def _update_in_place(current, new) -> None:
+    """Makes dict current equal to dict new, only adding/removing/replacing changed keys."""
+    for key in current.keys() - new.keys():
+        del current[key]
+    for key, value in new.items():
+        if current.get(key) != value:
+            current[key] = value
+
 
 class DiscordBot:
     """A class to encapsulate all relevant methods of the Discord bot."""
@@ -24,20 +118,42 @@ class DiscordBot:
 
         # Instantiate Telegram bot to send out messages to users
         TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.telegram_bot = Bot(TELEGRAM_TOKEN)
+        # Connection pool matches concurrent sends (PTB's default pool has one connection)
+        request = HTTPXRequest(connection_pool_size=_MAX_CONCURRENT_SENDS)
+        self.telegram_bot = Bot(TELEGRAM_TOKEN, request=request)
         # Sets of Discord usernames & roles that trigger Telegram notifications
         self.listening_to = {"handles": set(), "roles": set()}
         # Reverse lookup {"handles": {discord username: {telegram id, telegram id}}
         self.discord_telegram_map = {"handles": {}, "roles": {}}
         # Dict to store whitelisted channels per TG_id if user has specified any
         self.channel_whitelist = {}
+        # Dispatch index {(trigger, guild id): {telegram id, ...}}, one for handles and one for roles
+        self._handle_targets = {}
+        self._role_targets = {}
+        # Verified telegram ids by active channels {guild id: {telegram id, ...}} for users
+        # without channel restrictions and {(guild id, channel name): {telegram id, ...}}
+        self._allowed_all = {}
+        self._allowed_by_channel = {}
         # Switch on logging of bot data & callback data (inline button presses) for debugging
         self.debug_mode = debug_mode
         # Dictionary {telegram id: {data}}
         self.users = dict()
         # Path to shared database (data entry via telegram_bot.py)
         self.data_path = "./data"
+        self.user_store = UserStore(self.data_path)
         self.client = None
+        # Member id lookup by username per guild {guild id: {username: member id}}
+        self._member_index = {}
+        # Caps concurrent Telegram requests to the connection pool size. Set in run_bot()
+        self._send_semaphore = None
+        # Telegram ids of users who blocked the bot, not yet deleted from the pickle file
+        self._pending_deletions = set()
+        # Signals the background writer that there are pending deletions. Set in run_bot()
+        self._dirty = None
+        # Channels forwarded to everyone & channel categories shown in the channels menu
+        always_active = json.loads(os.getenv("ALWAYS_ACTIVE_CHANNELS") or "[]")
+        self._always_active_channels = frozenset(int(x) for x in always_active)
+        self._allowed_categories = frozenset(json.loads(os.getenv("ALLOWED_CHANNEL_CATEGORIES") or "[]"))
 
 
     async def refresh_data(self) -> None:
@@ -45,140 +161,113 @@ class DiscordBot:
 
         # Reload database from file. Skip all if no file created yet.
         try:
-            self.users = read_pickle(self.data_path)["user_data"]
+            self.users = await self.user_store.all_users()
         except FileNotFoundError:
             return    # Pickle file will be created automatically
+        except (EOFError, pickle.UnpicklingError) as e:
+            # File still incomplete after retries -> Keep data from last refresh
+            log(f"Couldn't read database: {e!r}. Keeping previous data.")
+            return
 
-        # Wipe listening_to, discord_telegram_map, channel_whitelist
-        self.listening_to = {"handles": set(), "roles": set()}
-        self.discord_telegram_map = {"handles": {}, "roles": {}}
-        self.channel_whitelist = {}
+        # Don't bring back users whose deletion hasn't been written to file yet
+        for TG_id in self._pending_deletions:
+            self.users.pop(TG_id, None)
+
+        # Collect notification triggers and reverse lookups in a single pass
+        new_handles, new_roles, new_whitelist = {}, {}, {}
 
-        # Repopulate sets of notification triggers and reverse lookups
-        for k, v in self.users.items():
-            TG_id = k
+        for TG_id, v in self.users.items():
 
-            # Add Discord handles to set of notification triggers
+            # Add Discord handle to reverse lookup
             if "discord handle" in v:
-                handle = v["discord handle"]
-                self.listening_to["handles"].add(handle)
-                # Add Discord handle to reverse lookup
-                if handle not in self.discord_telegram_map["handles"]:
-                    self.discord_telegram_map["handles"][handle] = set()
-                self.discord_telegram_map["handles"][handle].add(TG_id)
-
-            # Add Discord roles to set of notification triggers & reverse lookup
+                new_handles.setdefault(v["discord handle"], set()).add(TG_id)
+
+            # Add Discord roles to reverse lookup (either one role or several)
             if "discord roles" in v:
                 roles = v["discord roles"]
-
-                # Possibility: Only one role set up -> Add it to dicts
                 if isinstance(roles, str):
-                    role = roles
+                    roles = [roles]
+                for role in roles:
+                    new_roles.setdefault(role, set()).add(TG_id)
 
-                    if role not in self.discord_telegram_map["roles"]:
-                        self.discord_telegram_map["roles"][role] = set()
-
-                    self.discord_telegram_map["roles"][role].add(TG_id)
-                    self.listening_to["roles"].add(role)
-
-                # Possibility: Multiple roles set up -> Add all to dicts
-                else:
-                    for role in roles:
+            # Add Discord channels to channel whitelist
+            if "discord channels" in v:
+                new_whitelist[TG_id] = v["discord channels"]
 
-                        if role not in self.discord_telegram_map["roles"]:
-                            self.discord_telegram_map["roles"][role] = set()
+        # Only touch entries that changed since the last refresh
+        _update_in_place(self.discord_telegram_map["handles"], new_handles)
+        _update_in_place(self.discord_telegram_map["roles"], new_roles)
+        _update_in_place(self.channel_whitelist, new_whitelist)
 
-                        self.discord_telegram_map["roles"][role].add(TG_id)
+        # Sets of notification triggers
+        self.listening_to["handles"] = set(new_handles)
+        self.listening_to["roles"] = set(new_roles)
 
-                    self.listening_to["roles"].update(roles)
+        # Rebuild dispatch index so on_message doesn't need to filter per user
+        self._handle_targets = self._build_targets(self.discord_telegram_map["handles"])
+        self._role_targets = self._build_targets(self.discord_telegram_map["roles"])
+        self._build_channel_index()
 
-            # Add Discord channels to channel whitelist
-            if "discord channels" in v:
-                self.channel_whitelist[k] = v["discord channels"]
 
-
-    async def send_to_TG(self, telegram_user_id, content, header="", guild=None, parse_mode='HTML') -> None:
+    def _build_targets(self, trigger_map) -> dict:
         """
-        Sends a message a specific Telegram user id. Does some replacing & escaping.
-        Adds header to msg. Defaults to HTML parsing.
+        Takes a reverse lookup {trigger: {telegram id, ...}}, returns
+        {(trigger, guild id): {telegram id, ...}} using each user's guild.
+        Skips unverified users & users without a guild set up.
         """
+        targets = {}
 
-        def add_html_hyperlinks(_str):
-            """Adds html hyperlink tags around any url starting with http or https."""
-            url_pattern = re.compile(r"""((https://|http://)[^ <>'"{}|\\^`[\]]*)""")
-            return url_pattern.sub(r"<a href='\1'>\1</a>", _str)
-
-        def resolve_usernames(_str, guild):
-            """Replaces mentions of user ids with their actual nicks/names."""
+        for trigger, TG_ids in trigger_map.items():
+            for TG_id in TG_ids:
+                user = self.users[TG_id]
+                guild_id = user.get("discord guild")
 
-            user_mention = r"<@[0-9]+>"
-            user_ids = re.findall(user_mention, _str)
+                if not user.get("verified discord") or guild_id is None:
+                    continue
 
-            # Replace each user id with a nickname or username
-            for id_match in user_ids:
-                id_int = int(id_match.strip('<>@'))
-                member = guild.get_member(id_int)
-                name = member.name
-                if member.nick: name = member.nick
-                _str = _str.replace(id_match, str("🌀<i>"+name+"</i>"))
-
-            return _str
+                targets.setdefault((trigger, guild_id), set()).add(TG_id)
 
-        def resolve_role_names(_str, guild):
-            """Replaces mentions of user ids with their actual nicks/names."""
+        return targets
 
-            role_mention = r"<@&[0-9]+>"
-            role_ids = re.findall(role_mention, _str)
 
-            # Replace each role id with its name
-            for id_match in role_ids:
-                id_int = int(id_match.strip('<>@&'))
-                role = guild.get_role(id_int)
-                name = role.name
-                _str = _str.replace(id_match, str("🌀<i>"+name+"</i>"))
+    def _build_channel_index(self) -> None:
+        """Indexes verified users by the channels they get notifications for."""
+        self._allowed_all = {}
+        self._allowed_by_channel = {}
 
-            return _str
+        for TG_id, user in self.users.items():
 
-        def resolve_channels(_str, guild):
-            """Replaces mentions of user ids with their actual nicks/names."""
+            guild_id = user.get("discord guild")
 
-            channel_mention = r"&lt;#[0-9]+&gt;"
-            channel_ids = re.findall(channel_mention, _str)
+            # Unverified users & users without a guild get no handle or role notifications
+            if not user.get("verified discord") or guild_id is None:
+                continue
 
-            # Wrap a hyperlink around each channel id
-            for id_match in channel_ids:
-                id_int = int(id_match.strip('&lgt;#'))
-                channel = guild.get_channel_or_thread(id_int)
-                name = channel.name
-                url = channel.jump_url
-                _str = _str.replace(id_match, f"<a href='{url}'>{name}</a>")
+            whitelist = self.channel_whitelist.get(TG_id)
 
-            return _str
+            # No channels set up -> Notifications from all channels
+            if not whitelist:
+                self._allowed_all.setdefault(guild_id, set()).add(TG_id)
+            else:
+                for channel in whitelist:
+                    self._allowed_by_channel.setdefault((guild_id, channel), set()).add(TG_id)
 
-        def escape_chars(_str):
-            """
-            Replaces the HTML special character "&".
-            Replace "<", ">", "&" if not within HTML tags <b>, <i> and <a>.
-            """
-            # Replace "&" with "&amp;" everywhere
-            _str = re.sub("&", "&amp;", _str)
 
-            # Replace "<" with "&lt;" if not followed by "b>", "i>", "/", or "a"
-            lt_not_part_of_tag = "<(?!(b>|i>|u>|/|a))" # negative lookahead
-            _str = re.sub(lt_not_part_of_tag, "&lt;", _str)
+    def _allowed_in(self, guild_id, channel) -> set:
+        """Returns verified telegram ids with notifications active in this channel."""
+        return self._allowed_all.get(guild_id, _NO_IDS) | self._allowed_by_channel.get((guild_id, channel), _NO_IDS)
 
-            # Replace ">" with "&gt;" if not preceded by "b", "i", "a", or "'"
-            gt_not_part_of_tag = "(?<!(b|i|a|u|'))>" # negative lookbehind
-            _str = re.sub(gt_not_part_of_tag, "&gt;", _str)
 
-            return _str
+    async def send_to_TG(self, telegram_user_id, content, header="", guild=None, parse_mode='HTML') -> None:
+        """
+        Sends a message a specific Telegram user id. Does some replacing & escaping.
+        Adds header to msg. Defaults to HTML parsing.
+        """
 
         # Execute replacements (order matters to avoid double hyperlinking)
 
-        # Replace mentioned user ids with usernames
-        content = resolve_usernames(content, guild)
-        # Replace mentioned role ids with role names
-        content = resolve_role_names(content, guild)
+        # Replace mentioned user ids with usernames & role ids with role names
+        content = resolve_mentions(content, guild)
         # Replace special chars with their escape seqences
         content = escape_chars(content)
         # Convert urls in content to hyperlinks & concatenate msg back together
@@ -190,12 +279,24 @@ class DiscordBot:
 
         # Send to user unless they deleted (=blocked) the chat with the bot.
         try:
-            await self.telegram_bot.send_message(
-                chat_id=telegram_user_id,
-                text=parsed_msg,
-                disable_web_page_preview=True,
-                parse_mode=parse_mode
-                )
+            async with self._send_semaphore:
+                for attempt in range(1, _SEND_ATTEMPTS+1):
+                    try:
+                        await self.telegram_bot.send_message(
+                            chat_id=telegram_user_id,
+                            text=parsed_msg,
+                            disable_web_page_preview=True,
+                            parse_mode=parse_mode
+                            )
+                        break
+
+                    # Rate limit hit -> Wait as long as Telegram asks, then try again.
+                    # Holding the semaphore while waiting slows down the other sends too.
+                    except RetryAfter as e:
+                        if attempt == _SEND_ATTEMPTS:
+                            raise
+                        log(f"Rate limited by Telegram. Retrying in {e.retry_after}s.")
+                        await asyncio.sleep(e.retry_after)
 
             if self.debug_mode:
                 log(f"FORWARDED A MESSAGE!")
@@ -205,24 +306,73 @@ class DiscordBot:
 
             log(f"Blocked by user {telegram_user_id}. Didn't forward.")
 
-            data = read_pickle(self.data_path)
+            if int(telegram_user_id) in self.users:
+
+                self._forget_user(int(telegram_user_id))
+                self._pending_deletions.add(int(telegram_user_id))
+                self._dirty.set()    # Deleted from file by _pickle_writer()
+
+
+    def _forget_user(self, TG_id) -> None:
+        """Removes a Telegram user from users & all notification trigger lookups."""
 
-            if int(telegram_user_id) in data["user_data"]:
+        self.users.pop(TG_id, None)
+        self.channel_whitelist.pop(TG_id, None)
 
-                del data["user_data"][int(telegram_user_id)]
-                write_to_pickle(data, self.data_path)
-                log(f"Deleted user {telegram_user_id} from database.")
+        # Remove TG id from reverse lookups, drop triggers nobody listens to anymore
+        for category, trigger_dict in self.discord_telegram_map.items():
+            for trigger in [k for k, v in trigger_dict.items() if TG_id in v]:
+                trigger_dict[trigger].discard(TG_id)
+                if not trigger_dict[trigger]:
+                    del trigger_dict[trigger]
+                    self.listening_to[category].discard(trigger)
 
-                await self.refresh_data()
+        # Remove TG id from dispatch & channel indexes
+        for index in (self._handle_targets, self._role_targets, self._allowed_all, self._allowed_by_channel):
+            for key in [k for k, v in index.items() if TG_id in v]:
+                index[key].discard(TG_id)
+                if not index[key]:
+                    del index[key]
+
+
+    async def _pickle_writer(self, interval=10) -> None:
+        """
+        Background task deleting blocked users from the pickle file. Writes
+        at most once every interval seconds, batching all pending deletions.
+        """
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+
+            pending = set(self._pending_deletions)
+
+            # On failure keep ids pending & retry after interval (task must not die)
+            try:
+                await self.user_store.delete_users(pending)
+            except Exception as e:
+                log(f"Failed to delete users {pending} from database: {e!r}. Retrying.")
+                self._dirty.set()
+            else:
+                self._pending_deletions -= pending
+                log(f"Deleted users {pending} from database.")
+
+            await asyncio.sleep(interval)
 
 
     async def send_to_all(self, content, **kwargs) -> None:
         """Sends a message to all Telegram bot users except if they wiped their data."""
         TG_ids = [k for k, v in self.users.items() if v != {}]
 
-        for _id in TG_ids:
+        await self.gather_sends(self.send_to_TG(_id, content, **kwargs) for _id in TG_ids)
+
+
+    async def gather_sends(self, sends) -> None:
+        """Awaits send_to_TG() coroutines concurrently, logs any that failed."""
+        results = await asyncio.gather(*sends, return_exceptions=True)
 
-            await self.send_to_TG(_id, content, **kwargs)
+        for result in results:
+            if isinstance(result, Exception):
+                log(f"Failed to forward a message: {result!r}")
 
 
     async def get_guild(self, guild_id) -> discord.Guild:
@@ -239,10 +389,44 @@ class DiscordBot:
         return guild.get_channel(channel_id)
 
 
+    def _index_members(self, guild) -> dict:
+        """(Re)builds the username -> member id lookup of a guild, returns it."""
+        self._member_index[guild.id] = {m.name: m.id for m in guild.members}
+        return self._member_index[guild.id]
+
+
+    def _unindex_member(self, guild_id, username, member_id) -> None:
+        """Removes a username from a guild's lookup if it still points to this member."""
+        index = self._member_index.get(guild_id)
+        if index is not None and index.get(username) == member_id:
+            del index[username]
+
+
+    def _lookup_member(self, guild, username) -> discord.Member:
+        """Takes guild & username, returns member object or None if not found."""
+
+        # Legacy "name#discriminator" handles aren't indexed
+        if "#" in username:
+            return guild.get_member_named(username)
+
+        index = self._member_index.get(guild.id)
+        if index is None:
+            index = self._index_members(guild)
+
+        # Ids are resolved by the guild's own cache, so member objects are always current
+        member_id = index.get(username)
+        member = guild.get_member(member_id) if member_id is not None else None
+
+        # Not a username -> Fall back to linear search (also matches server nicknames)
+        if member is None:
+            member = guild.get_member_named(username)
+        return member
+
+
     async def get_user(self, guild_id, username) -> discord.User:
         """Takes guild id & username, returns user object or None if not found."""
         guild = await self.get_guild(guild_id)
-        return guild.get_member_named(username)
+        return self._lookup_member(guild, username)
 
 
     async def get_user_id(self, guild_id, username) -> str:
@@ -260,7 +444,7 @@ class DiscordBot:
     async def get_user_roles(self, discord_username, guild_id) -> list:
         """Takes a Discord username, returns all user's role names in current guild."""
         guild = await self.get_guild(guild_id)
-        user = guild.get_member_named(discord_username)
+        user = self._lookup_member(guild, discord_username)
         roles = [role.name for role in user.roles]
         return roles
 
@@ -273,7 +457,7 @@ class DiscordBot:
         channels = guild.channels
 
         # Only show channels from welcome, community & contribute categories
-        allowed_channel_categories = json.loads(os.getenv("ALLOWED_CHANNEL_CATEGORIES"))
+        allowed_channel_categories = self._allowed_categories
 
         # Filter out anything but text channels + anything specified here:
         filter_out = ["ticket", "closed"]
@@ -317,6 +501,11 @@ class DiscordBot:
         # Update data to listen to at startup
         await self.refresh_data()
 
+        # Created here to be bound to the running event loop
+        self._send_semaphore = asyncio.Semaphore(_MAX_CONCURRENT_SENDS)
+        self._dirty = asyncio.Event()
+        writer = asyncio.create_task(self._pickle_writer())
+
         # Fire up discord client
         intents = discord.Intents.default()
         intents.members = True
@@ -330,17 +519,51 @@ class DiscordBot:
 
             log(f"{client.user.name} has connected to Discord")
 
+            for guild in client.guilds:
+                self._index_members(guild)
+
+        # Keep username -> member lookups up to date. Guilds not indexed yet
+        # are skipped (indexed completely on first lookup)
+        @client.event
+        async def on_member_join(member):
+            index = self._member_index.get(member.guild.id)
+            if index is not None:
+                index[member.name] = member.id
+
+        @client.event
+        async def on_member_update(before, after):
+            index = self._member_index.get(after.guild.id)
+            if index is None:
+                return
+            if before.name != after.name:
+                self._unindex_member(after.guild.id, before.name, before.id)
+            index[after.name] = after.id
+
+        # Username changes are user (not member) events
+        @client.event
+        async def on_user_update(before, after):
+            if before.name == after.name:
+                return
+            for guild in client.guilds:
+                member = guild.get_member(after.id)
+                index = self._member_index.get(guild.id)
+                if member is not None and index is not None:
+                    self._unindex_member(guild.id, before.name, before.id)
+                    index[member.name] = member.id
+
+        @client.event
+        async def on_member_remove(member):
+            self._unindex_member(member.guild.id, member.name, member.id)
+
         # Actions taken for every new Discord message
         @client.event
         async def on_message(message):
 
             # If message in non-deactivatable channel -> Forward to everyone known to TG bot
-            always_active_channels = json.loads(os.getenv("ALWAYS_ACTIVE_CHANNELS"))
-            always_active_channels = [int(x) for x in always_active_channels]
             guild = message.guild
             channel_id = message.channel.id
 
-            if channel_id in always_active_channels:
+            if channel_id in self._always_active_channels:
                 channel = message.channel.name
 
                 if self.debug_mode:
@@ -361,154 +584,115 @@ class DiscordBot:
                 return    # -> Skip every other case
 
 
-            # If no user mentions in message -> Skip this part
-            if message.mentions != []:
-
-                if self.debug_mode: log(f"{len(message.mentions)} USER MENTIONS IN {message.channel.name}.")
-
-                channel = message.channel.name
-                whitelist = self.channel_whitelist
-
-                # User mentions: Forward to TG as specified in lookup dict
-                for username in self.listening_to["handles"]:
-                    user = message.guild.get_member_named(username)
-
-                    # Cycle through all user mentions in message
-                    if user in message.mentions:
+            # Collect all forwards for this message to send them concurrently
+            sends = []
 
-                        if self.debug_mode: log(f"USER IN MENTIONS: {username} mentioned.")
+            # Local names for attributes used within the dispatch loops
+            debug, send = self.debug_mode, self.send_to_TG
+            listening_to = self.listening_to
 
-                        msg_author, guild, channel = message.author, message.guild, message.channel.name
-                        alias, url = user.display_name, message.jump_url
-                        content = message.content
-                        author = msg_author.name
-                        if msg_author.nick: author = msg_author.nick
-                        header = f"\nMentioned by 🌀<i>{author}</i> in <a href='{url}'>{channel}</a>:\n\n"
+            # Mentioned users by server nickname, username & "name#discriminator" (legacy handles)
+            mentioned = {u.nick: u for u in message.mentions if getattr(u, "nick", None)}
+            mentioned.update({u.name: u for u in message.mentions})
+            mentioned.update({str(u): u for u in message.mentions})
+            handle_hits = listening_to["handles"].intersection(mentioned)
 
-                        # Cycle through all TG ids connected to this Discord handle
-                        for _id in self.discord_telegram_map["handles"][username]:
+            # If no listened to handles mentioned in message -> Skip this part
+            if handle_hits:
 
-                            target_guild_id = self.users[_id]["discord guild"]
+                if debug: log(f"{len(message.mentions)} USER MENTIONS IN {message.channel.name}.")
 
-                            if self.debug_mode:
-                                log(
-                                    f"GUILD CHECK: {type(guild.id)} {guild.id} =="
-                                    f" {type(target_guild_id)} {target_guild_id}:"
-                                    f" {guild.id == target_guild_id}"
-                                )
+                channel = message.channel.name
 
-                            # Condition 1: User Discord is verified
-                            if self.users[_id]["verified discord"]:
+                # Verified TG ids with notifications active in this channel
+                allowed = self._allowed_in(message.guild.id, channel)
+                handle_targets = self._handle_targets
 
-                                # Condition 2: msg guild matches guild set up by user
-                                if guild.id == target_guild_id:
+                # User mentions: Forward to TG as specified in lookup dict
+                for username in handle_hits:
+                    user = mentioned[username]
 
-                                    if self.debug_mode:
-                                        log(
-                                            f"CHANNEL CHECK: {channel} in whitelist:"
-                                            f" {channel in whitelist[_id]}\n"
-                                            f"SET UP CHANNELS: {whitelist[_id]}"
-                                        )
+                    if debug: log(f"USER IN MENTIONS: {username} mentioned.")
 
-                                    # Condition 3: Channel matches or no channels set up
-                                    if whitelist[_id] == set():
+                    msg_author, guild, channel = message.author, message.guild, message.channel.name
+                    alias, url = user.display_name, message.jump_url
+                    content = message.content
+                    author = msg_author.name
+                    if msg_author.nick: author = msg_author.nick
+                    header = f"\nMentioned by 🌀<i>{author}</i> in <a href='{url}'>{channel}</a>:\n\n"
 
-                                        await self.send_to_TG(
-                                            _id,
-                                            content,
-                                            header=header,
-                                            guild=guild
-                                        )
+                    # TG ids set up for this handle on this guild, verified & active in channel
+                    targets = handle_targets.get((username, guild.id), _NO_IDS) & allowed
 
-                                    else:
+                    if debug: log(f"CHANNEL CHECK: {len(targets)} USERS ACTIVE IN {channel}.")
 
-                                        if channel in whitelist[_id]:
+                    for _id in targets:
 
-                                            await self.send_to_TG(
-                                                _id,
-                                                content,
-                                                header=header,
-                                                guild=guild
-                                            )
+                        sends.append(send(
+                            _id,
+                            content,
+                            header=header,
+                            guild=guild
+                        ))
 
-                            else:
-                                if self.debug_mode: log(f"UNVERIFIED DISCORD: {_id}. NO HANDLE NOTIFICATION SENT.")
 
+            # Mentioned roles, including mention of @everyone as role mention
+            rolenames = {x.name for x in message.role_mentions}
+            if message.mention_everyone:
+                rolenames.add('@everyone')
+            role_hits = listening_to["roles"] & rolenames
 
-            # If no role mentions in message -> Skip this part
-            if message.role_mentions != [] or message.mention_everyone:
+            # If no listened to roles mentioned in message -> Skip this part
+            if role_hits:
 
-                if self.debug_mode: log(f"ROLE MENTIONS IN MESSAGE: {message.role_mentions}")
+                if debug: log(f"ROLE MENTIONS IN MESSAGE: {message.role_mentions}")
 
                 channel = message.channel.name
-                whitelist = self.channel_whitelist
-                rolenames = [x.name for x in message.role_mentions]
 
-                # Add in mention of @everyone as role mention
-                if message.mention_everyone:
-                    rolenames.append('@everyone')
+                # Verified TG ids with notifications active in this channel
+                allowed = self._allowed_in(message.guild.id, channel)
+                role_targets = self._role_targets
 
                 # Role mentions: Forward to TG as specified in lookup dict
-                for role in self.listening_to["roles"]:
-
-                    if role in rolenames:
-
-                        if self.debug_mode: log(f"MATCHED A ROLE: {role} mentioned.")
-
-                        guild = message.guild
-                        url = message.jump_url
-                        channel = message.channel.name
-                        content = message.content
-                        author = message.author.name
+                for role in role_hits:
 
-                        header = f"🌀<i>{author}</i> mentioned <i>{role}</i> in <a href='{url}'>{channel}</a>:\n\n"
+                    if debug: log(f"MATCHED A ROLE: {role} mentioned.")
 
+                    guild = message.guild
+                    url = message.jump_url
+                    channel = message.channel.name
+                    content = message.content
+                    author = message.author.name
 
-                        # Cycle through all TG ids connected to this Discord role
-                        for _id in self.discord_telegram_map["roles"][role]:
+                    header = f"🌀<i>{author}</i> mentioned <i>{role}</i> in <a href='{url}'>{channel}</a>:\n\n"
 
-                            target_guild_id = self.users[_id]["discord guild"]
+                    # TG ids set up for this role on this guild, verified & active in channel
+                    targets = role_targets.get((role, guild.id), _NO_IDS) & allowed
 
-                            if self.debug_mode:
-                                log(
-                                    f"GUILD CHECK: {guild.id} == {target_guild_id}:"
-                                    f" {guild.id == target_guild_id}"
-                                )
+                    if debug: log(f"CHANNEL CHECK: {len(targets)} USERS ACTIVE IN {channel}.")
 
-                            # Condition 1: User Discord is verified
-                            if self.users[_id]["verified discord"]:
+                    for _id in targets:
 
-                                # Condition 2: msg guild matches guild set up by user
-                                if guild.id == target_guild_id:
-                                    if self.debug_mode:
-                                        log(
-                                            f"CHANNEL CHECK: {type(channel)} {channel} in"
-                                            f" {whitelist[_id]}: {channel in whitelist[_id]}\n"
-                                            f"SET UP CHANNELS: {whitelist[_id]}"
-                                        )
+                        sends.append(send(
+                            _id,
+                            content,
+                            header=header,
+                            guild=guild
+                        ))
 
-                                    # Condition 3: Channel matches or no channels set up
-                                    if whitelist[_id] == set():
-
-                                        await self.send_to_TG(
-                                            _id,
-                                            content,
-                                            header=header,
-                                            guild=guild
-                                        )
-
-                                    else:
-
-                                        if channel in whitelist[_id]:
-
-                                            await self.send_to_TG(
-                                                _id,
-                                                content,
-                                                header=header,
-                                                guild=guild
-                                            )
-                            else:
-                                if self.debug_mode: log("UNVERIFIED DISCORD. NO ROLE NOTIFICATION SENT.")
+            await self.gather_sends(sends)
 
         DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-        await client.start(DISCORD_TOKEN)
+        try:
+            await client.start(DISCORD_TOKEN)
+        finally:
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+            # Write deletions still pending at shutdown
+            if self._pending_deletions:
+                try:
+                    await self.user_store.delete_users(set(self._pending_deletions))
+                    log(f"Deleted users {self._pending_deletions} from database.")
+                except Exception as e:
+                    log(f"Failed to delete users {self._pending_deletions} from database: {e!r}")
@@ -4,6 +4,12 @@ This file contains contains helper functions callable by any of the 2 bots.
 
 import logging
 import pickle
+import asyncio
+import os
+import stat
+import tempfile
+import time
+from pandas import read_pickle
 
 
 def log(msg, level="INFO") -> None:
@@ -42,5 +48,60 @@ def iter_to_str(iterable, ignore_list=[], prefix="\n\n", suffix="\n\n") -> str:
 
 
 def write_to_pickle(obj, filepath):
-    with open(filepath, 'wb') as handle:
-        pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    """Writes obj to a temp file first, then replaces filepath (never half-written)."""
+    dirname = os.path.dirname(os.path.abspath(filepath))
+    handle = tempfile.NamedTemporaryFile("wb", dir=dirname, delete=False)
+
+    try:
+        with handle:
+            pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        # Keep permissions of the existing file (temp files are created as 0600)
+        if os.path.exists(filepath):
+            os.chmod(handle.name, stat.S_IMODE(os.stat(filepath).st_mode))
+        os.replace(handle.name, filepath)
+
+    # Don't leave temp files behind if anything failed
+    except BaseException:
+        os.unlink(handle.name)
+        raise
+
+
+def read_complete_pickle(filepath, attempts=3, delay=0.5):
+    """
+    Reads a pickle file another writer may be rewriting in place. Retries
+    if the file is incomplete, raises the last error after all attempts.
+    """
+    for attempt in range(1, attempts+1):
+        try:
+            return read_pickle(filepath)
+        except (EOFError, pickle.UnpicklingError):
+            if attempt == attempts:
+                raise
+            time.sleep(delay)
+
+
+class UserStore:
+    """
+    Access to the user data in the Telegram bot's persistence file
+    {"user_data": {telegram id: {data}}, ...}. Reads run in a worker thread,
+    writes on the event loop (see delete_users).
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    async def all_users(self) -> dict:
+        """Returns {telegram id: {data}}. Raises FileNotFoundError if no file yet."""
+        data = await asyncio.to_thread(read_complete_pickle, self.filepath)
+        return data["user_data"]
+
+    async def delete_users(self, TG_ids) -> None:
+        """
+        Deletes all given telegram ids from the file in a single read & write.
+        Runs on the event loop like the Telegram bot's own (synchronous) file
+        dumps, so none of them can land between this read and write.
+        """
+        data = read_pickle(self.filepath)
+        for TG_id in TG_ids:
+            data["user_data"].pop(TG_id, None)
+        write_to_pickle(data, self.filepath)
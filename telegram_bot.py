@@ -60,6 +60,8 @@ class TelegramBot:
         ]
         self.markup = ReplyKeyboardMarkup(reply_keyboard, one_time_keyboard=True)
         self.application = None
+        # Role name prefixes not added automatically with a new handle (tuple for str.startswith)
+        self.roles_exempt_by_default = tuple(json.loads(os.getenv("ROLES_EXEMPT_BY_DEFAULT") or "[]"))
 
 
     def set_discord_instance(self, bot) -> None:
@@ -540,9 +542,9 @@ class TelegramBot:
                 # Automatically add user roles if Discord handle exists
                 if check != None:
 
-                    to_ignore = json.loads(os.getenv("ROLES_EXEMPT_BY_DEFAULT"))
+                    to_ignore = self.roles_exempt_by_default
                     all_roles = await self.discord_bot.get_user_roles(text, guild_id)
-                    roles = [r for r in all_roles if not any(r.startswith(s) for s in to_ignore)]
+                    roles = [r for r in all_roles if not r.startswith(to_ignore)]
                     # If new & valid Discord handle entered: Reset verification status
                     context.user_data["verified discord"] = False
                     if roles != []: